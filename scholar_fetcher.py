@@ -1,15 +1,50 @@
 import imaplib
 import email
+import json
 from email import policy
 import sqlite3
 from datetime import datetime
 import logging
-from bs4 import BeautifulSoup
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import threading
+from lxml import etree, html as lhtml
 from dataclasses import dataclass
 from typing import List, Optional
 import os
-from urllib.parse import unquote
+from urllib.parse import unquote_to_bytes
+import random
 import re
+import time
+from contextlib import contextmanager, suppress
+
+# RFC 2177 asks clients to re-issue IDLE at least every 29 minutes; RFC 3501
+# only guarantees 30 minutes before an idle session is logged out
+_IDLE_TIMEOUT = 29 * 60
+# Upper bound in seconds for the retry backoff in the monitoring loop
+_MAX_BACKOFF = 300
+
+_URL_RE = re.compile(r'url=([^&]+)')
+_VENUE_YEAR_RE = re.compile(r'(.*?),\s*(\d{4})')
+
+_TITLE_XPATH = etree.XPath('//a[contains(concat(" ", normalize-space(@class), " "), " gse_alrt_title ")]')
+_AUTHOR_VENUE_XPATH = etree.XPath('//div[contains(@style, "#006621")]')
+_SCHOLAR_LINK_XPATH = etree.XPath('//a[contains(@href, "scholar.google.com/citations")]')
+
+# Shared by the single and bulk insert paths so sqlite3's statement cache
+# prepares it once per connection
+_INSERT_PUBLICATION_SQL = """
+    INSERT OR IGNORE INTO publications 
+    (title, authors, venue, year, url, scholar_url, 
+     notification_date, email_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _unquote_url(value: str) -> str:
+    """Percent-decode a URL in one pass; same result as urllib.parse.unquote."""
+    if '%' not in value:
+        return value
+    return unquote_to_bytes(value).decode('utf-8', 'replace')
 
 @dataclass
 class ScholarPublication:
@@ -23,20 +58,61 @@ class ScholarPublication:
     notification_date: datetime
     email_id: str
 
+    def to_row(self) -> tuple:
+        """Return the parameters for _INSERT_PUBLICATION_SQL."""
+        return (
+            self.title,
+            json.dumps(self.authors, ensure_ascii=False),
+            self.venue,
+            self.year,
+            self.url,
+            self.scholar_url,
+            self.notification_date.isoformat(),
+            self.email_id
+        )
+
 class ScholarMonitor:
     def __init__(self, 
                  email_address: str,
                  email_password: str,
                  db_path: str = "scholar_publications.db",
-                 imap_server: str = "imap.gmail.com"):
+                 imap_server: str = "imap.gmail.com",
+                 bulk_size: int = 100):
         """Initialize the Scholar monitor."""
         self.email_address = email_address
         self.email_password = email_password
         self.imap_server = imap_server
+        self.bulk_size = bulk_size
         self.db_path = db_path
+        self._mail = None
         self.logger = self._setup_logging()
+        # Autocommit mode; transactions are opened explicitly by _transaction()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                    isolation_level=None)
         self.setup_database()
 
+    def close(self):
+        """Close the IMAP and database connections and flush pending log records."""
+        self.disconnect()
+        self.conn.close()
+        # Detach first so nothing is queued after the listener stops draining
+        self.logger.removeHandler(self._log_handler)
+        self._log_listener.stop()
+
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements in one BEGIN IMMEDIATE ... COMMIT transaction."""
+        # IMMEDIATE takes the write lock up front instead of upgrading mid-transaction
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            self.conn.execute("COMMIT")
+        except BaseException:
+            # SQLite may already have rolled back on its own (e.g. SQLITE_FULL)
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            raise
+
     def _setup_logging(self) -> logging.Logger:
         """Setup logging configuration."""
         logger = logging.getLogger('ScholarMonitor')
@@ -55,40 +131,60 @@ class ScholarMonitor:
         fh.setFormatter(formatter)
         ch.setFormatter(formatter)
         
-        logger.addHandler(fh)
-        logger.addHandler(ch)
+        # Write records from a background thread so the hot path never blocks on I/O
+        log_queue = queue.Queue(-1)
+        self._log_listener = QueueListener(log_queue, fh, ch)
+        self._log_listener.start()
+        self._log_handler = QueueHandler(log_queue)
+        logger.addHandler(self._log_handler)
         
         return logger
 
     def setup_database(self):
         """Setup SQLite database for storing publications."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS publications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                authors TEXT NOT NULL,
-                venue TEXT,
-                year INTEGER,
-                url TEXT,
-                scholar_url TEXT,
-                notification_date TEXT NOT NULL,
-                email_id TEXT UNIQUE,
-                UNIQUE(title, authors, year)
-            )
-        """)
+        cursor = self.conn.cursor()
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS processed_emails (
-                email_id TEXT PRIMARY KEY,
-                process_date TEXT NOT NULL
-            )
+        # page_size must be set before the database switches to WAL
+        cursor.executescript("""
+            PRAGMA page_size=8192;
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-20000;
         """)
         
-        conn.commit()
-        conn.close()
+        with self._transaction():
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS publications (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    authors TEXT NOT NULL,
+                    venue TEXT,
+                    year INTEGER,
+                    url TEXT,
+                    scholar_url TEXT,
+                    notification_date TEXT NOT NULL,
+                    email_id TEXT UNIQUE,
+                    UNIQUE(title, authors, year)
+                )
+            """)
+            
+            # Version 1: authors stored as a JSON array instead of comma-joined text
+            if cursor.execute("PRAGMA user_version").fetchone()[0] < 1:
+                rows = cursor.execute(
+                    "SELECT id, authors FROM publications WHERE authors NOT LIKE '[%'"
+                ).fetchall()
+                cursor.executemany(
+                    "UPDATE publications SET authors = ? WHERE id = ?",
+                    [(json.dumps(authors.split(',') if authors else [], ensure_ascii=False), pub_id)
+                     for pub_id, authors in rows]
+                )
+                cursor.execute("PRAGMA user_version = 1")
+            
+            # Version 2: publications.email_id replaces the processed_emails table
+            if cursor.execute("PRAGMA user_version").fetchone()[0] < 2:
+                cursor.execute("DROP TABLE IF EXISTS processed_emails")
+                cursor.execute("PRAGMA user_version = 2")
 
     def connect_to_email(self) -> imaplib.IMAP4_SSL:
         """Connect to email server and select inbox."""
@@ -101,64 +197,79 @@ class ScholarMonitor:
             self.logger.error(f"Error connecting to email: {e}")
             raise
 
-    def parse_scholar_email(self, email_message: email.message.EmailMessage) -> Optional[ScholarPublication]:
+    def get_mail(self) -> imaplib.IMAP4_SSL:
+        """Return the persistent IMAP connection, connecting if needed."""
+        if self._mail is None:
+            self._mail = self.connect_to_email()
+        return self._mail
+
+    def disconnect(self):
+        """Drop the IMAP connection so the next call to get_mail() reconnects."""
+        if self._mail is not None:
+            with suppress(Exception):
+                self._mail.logout()
+            self._mail = None
+
+    def parse_scholar_email(self, email_message: email.message.EmailMessage,
+                            notification_date: Optional[datetime] = None) -> Optional[ScholarPublication]:
         """Parse Google Scholar notification email into a Publication object."""
+        if notification_date is None:
+            notification_date = datetime.now()
+        
         try:
             # Get HTML content
+            # get_body() stops at the first HTML body part and skips attachments,
+            # so only that part's payload is ever decoded
             html_content = None
-            if email_message.is_multipart():
-                for part in email_message.walk():
-                    if part.get_content_type() == "text/html":
-                        html_content = part.get_payload(decode=True).decode()
-                        break
-            else:
-                if email_message.get_content_type() == "text/html":
-                    html_content = email_message.get_payload(decode=True).decode()
+            html_part = email_message.get_body(preferencelist=('html',))
+            if html_part is not None:
+                html_content = html_part.get_content()
 
             if not html_content:
                 self.logger.warning("No HTML content found in email")
                 return None
 
             # Parse HTML
-            soup = BeautifulSoup(html_content, 'html.parser')
+            tree = lhtml.fromstring(html_content)
             
             # Find the main article link (title)
-            title_link = soup.find('a', class_='gse_alrt_title')
-            if not title_link:
+            title_links = _TITLE_XPATH(tree)
+            if not title_links:
                 self.logger.warning("No title found in email")
                 return None
                 
-            title = title_link.get_text(strip=True)
+            title_link = title_links[0]
+            title = title_link.text_content().strip()
             article_url = None
-            if 'href' in title_link.attrs:
-                url_match = re.search(r'url=([^&]+)', title_link['href'])
+            if 'href' in title_link.attrib:
+                url_match = _URL_RE.search(title_link.get('href'))
                 if url_match:
-                    article_url = unquote(url_match.group(1))
+                    article_url = _unquote_url(url_match.group(1))
             
             # Find author and venue info (in div with specific color)
-            author_venue_div = soup.find('div', style=lambda x: x and '#006621' in x)
+            author_venue_divs = _AUTHOR_VENUE_XPATH(tree)
             authors = []
             venue = None
-            year = datetime.now().year
+            year = notification_date.year
             
-            if author_venue_div:
+            if author_venue_divs:
                 # Text format: "Author1, Author2 - Venue, Year"
-                author_venue_text = author_venue_div.get_text(strip=True)
+                author_venue_text = author_venue_divs[0].text_content().strip()
                 if ' - ' in author_venue_text:
                     authors_part, venue_part = author_venue_text.split(' - ', 1)
                     authors = [author.strip() for author in authors_part.split(',')]
                     
                     # Extract venue and year
-                    venue_match = re.match(r'(.*?),\s*(\d{4})', venue_part)
+                    venue_match = _VENUE_YEAR_RE.match(venue_part)
                     if venue_match:
                         venue = venue_match.group(1).strip()
                         year = int(venue_match.group(2))
             
             # Find Scholar URL
             scholar_url = None
-            scholar_links = soup.find_all('a', href=lambda x: x and 'scholar.google.com/citations' in x)
+            scholar_links = _SCHOLAR_LINK_XPATH(tree)
             if scholar_links:
-                scholar_url = unquote(scholar_links[0]['href'])
+                scholar_url = _unquote_url(scholar_links[0].get('href'))
 
             return ScholarPublication(
                 title=title,
@@ -167,7 +278,7 @@ class ScholarMonitor:
                 year=year,
                 url=article_url,
                 scholar_url=scholar_url,
-                notification_date=datetime.now(),
+                notification_date=notification_date,
                 email_id=email_message['Message-ID']
             )
 
@@ -177,75 +288,167 @@ class ScholarMonitor:
 
     def store_publication(self, pub: ScholarPublication):
         """Store publication in database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute("""
-                INSERT INTO publications 
-                (title, authors, venue, year, url, scholar_url, 
-                 notification_date, email_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                pub.title,
-                ','.join(pub.authors),
-                pub.venue,
-                pub.year,
-                pub.url,
-                pub.scholar_url,
-                pub.notification_date.isoformat(),
-                pub.email_id
-            ))
-            
-            cursor.execute("""
-                INSERT INTO processed_emails (email_id, process_date)
-                VALUES (?, ?)
-            """, (pub.email_id, datetime.now().isoformat()))
-            
-            conn.commit()
-            self.logger.info(f"Stored publication: {pub.title}")
+            # A single statement commits on its own in autocommit mode
+            cursor = self.conn.execute(_INSERT_PUBLICATION_SQL, pub.to_row())
+            if cursor.rowcount == 0:
+                self.logger.info(f"Publication already exists: {pub.title}")
+            else:
+                self.logger.info(f"Stored publication: {pub.title}")
             
-        except sqlite3.IntegrityError:
-            self.logger.info(f"Publication already exists: {pub.title}")
         except Exception as e:
             self.logger.error(f"Error storing publication: {e}")
-            conn.rollback()
+
+    def store_publications_bulk(self, pubs: List[ScholarPublication]):
+        """Store a batch of publications in a single transaction."""
+        if not pubs:
+            return
+        
+        with self._transaction():
+            cursor = self.conn.executemany(_INSERT_PUBLICATION_SQL,
+                                           [pub.to_row() for pub in pubs])
+        
+        # Rows skipped by OR IGNORE are not counted
+        self.logger.info(f"Stored {cursor.rowcount} new publications "
+                         f"({len(pubs) - cursor.rowcount} already existed)")
+
+    def _split_processed(self, mail: imaplib.IMAP4_SSL, nums: List[bytes]):
+        """Split message numbers into new and already processed, using only Message-ID headers."""
+        message_ids = {}
+        for i in range(0, len(nums), self.bulk_size):
+            chunk = nums[i:i + self.bulk_size]
+            _, msg_data = mail.fetch(b','.join(chunk), '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
+            for item in msg_data:
+                if not isinstance(item, tuple):
+                    continue
+                message_id = email.message_from_bytes(item[1], policy=policy.default)['Message-ID']
+                if message_id:
+                    message_ids[item[0].split(None, 1)[0]] = str(message_id)
+        
+        processed_ids = set()
+        ids = list(message_ids.values())
+        for i in range(0, len(ids), self.bulk_size):
+            chunk = ids[i:i + self.bulk_size]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT email_id FROM publications WHERE email_id IN ({placeholders})",
+                chunk
+            )
+            processed_ids.update(row[0] for row in rows)
+        
+        new_nums = []
+        processed_nums = []
+        for num in nums:
+            if message_ids.get(num) in processed_ids:
+                processed_nums.append(num)
+            else:
+                new_nums.append(num)
+        return new_nums, processed_nums
+
+    def _fetch_worker(self, mail: imaplib.IMAP4_SSL, nums: List[bytes], fetch_queue: queue.Queue):
+        """Fetch messages in bulk_size chunks and queue the raw responses."""
+        try:
+            # Fetch in chunks to stay under server request size limits
+            for i in range(0, len(nums), self.bulk_size):
+                chunk = nums[i:i + self.bulk_size]
+                # PEEK leaves \Seen alone until the chunk has been stored
+                _, msg_data = mail.fetch(b','.join(chunk), '(BODY.PEEK[])')
+                fetch_queue.put(msg_data)
+        except Exception as e:
+            fetch_queue.put(e)
         finally:
-            conn.close()
+            fetch_queue.put(None)
+
+    def _parse_fetch_response(self, msg_data: list, notification_date: datetime):
+        """Parse a FETCH response into publications and their message numbers."""
+        publications = []
+        parsed_nums = []
+        # Response interleaves (header, body) tuples with b')' separators
+        for item in msg_data:
+            if not isinstance(item, tuple):
+                continue
+            num = item[0].split(None, 1)[0]
+            try:
+                email_message = email.message_from_bytes(item[1], policy=policy.default)
+                
+                # Parse publication data
+                publication = self.parse_scholar_email(email_message, notification_date)
+                
+                if publication:
+                    publications.append(publication)
+                    parsed_nums.append(num)
+                
+            except Exception as e:
+                self.logger.error(f"Error processing email {num}: {e}")
+                continue
+        
+        return publications, parsed_nums
+
+    def supports_idle(self) -> bool:
+        """Check whether both imaplib and the server support IMAP IDLE."""
+        mail = self.get_mail()
+        return hasattr(mail, 'idle') and 'IDLE' in mail.capabilities
+
+    def wait_for_new_mail(self, timeout: int):
+        """Block in IMAP IDLE until the server reports new mail or timeout expires."""
+        with self.get_mail().idle(duration=timeout) as responses:
+            for typ, _ in responses:
+                if typ == 'EXISTS':
+                    break
 
     def process_new_alerts(self):
         """Process new Google Scholar alert emails."""
-        mail = self.connect_to_email()
+        mail = self.get_mail()
+        
+        # Search for unread emails from Google Scholar
+        _, message_numbers = mail.search(None, '(UNSEEN FROM "scholaralerts-noreply@google.com")')
+        
+        nums = message_numbers[0].split()
+        if not nums:
+            return
         
+        # Only download full bodies for emails not seen before
+        nums, stored_nums = self._split_processed(mail, nums)
+        if stored_nums:
+            self.logger.info(f"Skipping {len(stored_nums)} already processed emails")
+        
+        # One timestamp for the whole batch
+        batch_ts = datetime.now()
+        
+        # Fetch on a background thread while this one parses and stores
+        fetch_queue = queue.Queue()
+        fetcher = threading.Thread(target=self._fetch_worker,
+                                   args=(mail, nums, fetch_queue),
+                                   daemon=True)
+        fetcher.start()
+        
+        fetch_error = None
         try:
-            # Search for unread emails from Google Scholar
-            _, message_numbers = mail.search(None, '(UNSEEN FROM "scholaralerts-noreply@google.com")')
-            
-            for num in message_numbers[0].split():
-                try:
-                    # Fetch email message
-                    _, msg_data = mail.fetch(num, '(RFC822)')
-                    email_body = msg_data[0][1]
-                    email_message = email.message_from_bytes(email_body, policy=policy.default)
-                    
-                    # Parse publication data
-                    publication = self.parse_scholar_email(email_message)
-                    
-                    if publication:
-                        # Store the publication
-                        self.store_publication(publication)
-                        
-                        # Mark email as read
-                        mail.store(num, '+FLAGS', '\\Seen')
-                        
-                        self.logger.info(f"Processed alert for: {publication.title}")
-                    
-                except Exception as e:
-                    self.logger.error(f"Error processing email {num}: {e}")
+            while True:
+                msg_data = fetch_queue.get()
+                if msg_data is None:
+                    break
+                if isinstance(msg_data, Exception):
+                    fetch_error = msg_data
                     continue
                 
+                publications, parsed_nums = self._parse_fetch_response(msg_data, batch_ts)
+                
+                # Store the whole chunk in one transaction
+                self.store_publications_bulk(publications)
+                stored_nums.extend(parsed_nums)
+                for publication in publications:
+                    self.logger.info(f"Processed alert for: {publication.title}")
         finally:
-            mail.logout()
+            fetcher.join()
+        
+        # Mark emails as read only once they are stored; the connection
+        # is not shared with the fetcher any more
+        for i in range(0, len(stored_nums), self.bulk_size):
+            mail.store(b','.join(stored_nums[i:i + self.bulk_size]), '+FLAGS', '\\Seen')
+        
+        if fetch_error is not None:
+            raise fetch_error
 
 def monitor_scholar_alerts(email_address: str, 
                          email_password: str, 
@@ -253,26 +456,52 @@ def monitor_scholar_alerts(email_address: str,
     """
     Continuously monitor for new Scholar alerts.
     
+    Uses IMAP IDLE on a persistent connection when the server supports it,
+    and falls back to polling every check_interval seconds otherwise. When
+    polling, the connection is kept between checks only if the interval is
+    short enough that the server will not log it out. Failures are retried
+    with exponential backoff.
+    
     Args:
         email_address: Gmail address
         email_password: Gmail app password
         check_interval: Time between checks in seconds (default: 1 hour)
     """
     monitor = ScholarMonitor(email_address, email_password)
+    failures = 0
     
-    while True:
-        try:
-            monitor.process_new_alerts()
-            monitor.logger.info(f"Sleeping for {check_interval} seconds...")
-            time.sleep(check_interval)
-        except Exception as e:
-            monitor.logger.error(f"Error in monitoring loop: {e}")
-            time.sleep(300)  # Wait 5 minutes before retrying
+    try:
+        while True:
+            try:
+                monitor.process_new_alerts()
+                failures = 0
+                
+                if monitor.supports_idle():
+                    monitor.logger.info("Waiting for new alerts...")
+                    monitor.wait_for_new_mail(min(check_interval, _IDLE_TIMEOUT))
+                else:
+                    # The server may log out a session left idle this long
+                    if check_interval > _IDLE_TIMEOUT:
+                        monitor.disconnect()
+                    monitor.logger.info(f"Sleeping for {check_interval} seconds...")
+                    time.sleep(check_interval)
+                continue
+            except (imaplib.IMAP4.abort, OSError) as e:
+                monitor.logger.warning(f"IMAP connection lost: {e}")
+                monitor.disconnect()
+            except Exception as e:
+                monitor.logger.error(f"Error in monitoring loop: {e}")
+            
+            delay = min(_MAX_BACKOFF, 2 ** min(failures, 10) + random.random())
+            failures += 1
+            monitor.logger.info(f"Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+    finally:
+        monitor.close()
 
 if __name__ == "__main__":
     import os
     from dotenv import load_dotenv
-    import time
     
     # Load email credentials from environment variables
     load_dotenv()